@@ -29,8 +29,12 @@
 # client_x509_cert_url = "https://www.googleapis.com/robot/v1/metadata/x509/..."
 # -----------------------------------------------------------------
 
+import functools
 import json
-from typing import List, Dict, Any
+import random
+import re
+import time
+from typing import List, Dict, Any, Tuple
 
 import pandas as pd
 import streamlit as st
@@ -58,7 +62,7 @@ BODY_WASH_RULES = {
         ("Preservative", "Preservative", "per supplier"),
         ("Fragrance / Colorant", "Aesthetic", "q.s.")
     ],
-    "surfactant_systems": [
+    "surfactant_systems": (
         {
             "name": "Classic SLES/CAPB",
             "tags": ["cost‑effective", "medium mildness"],
@@ -92,7 +96,7 @@ BODY_WASH_RULES = {
                 {"inci": "Cocamidopropyl Betaine", "role": "amphoteric", "range": "3–6%"}
             ]
         }
-    ]
+    )
 }
 
 FACIAL_CLEANSER_RULES = {
@@ -117,6 +121,34 @@ RULES_BY_PRODUCT = {
 # Google Sheets Client
 # ------------------------------
 
+# Sheets rate-limits bursts (429) and has occasional 5xx blips: retry those
+# with exponential backoff + jitter before surfacing an error in the UI.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Appends are not idempotent: a 5xx can arrive after the rows were committed,
+# and retrying would write them (and their ids) twice. A 429 is rejected before
+# anything is applied, so it is the only status safe to retry on writes.
+WRITE_RETRY_STATUS = {429}
+RETRY_ATTEMPTS = 5
+RETRY_MAX_WAIT = 16  # seconds
+
+
+def with_backoff(retry_status=RETRY_STATUS):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(RETRY_ATTEMPTS):
+                try:
+                    return fn(*args, **kwargs)
+                except gspread.exceptions.APIError as e:
+                    status = getattr(e.response, "status_code", None)
+                    if status not in retry_status or attempt == RETRY_ATTEMPTS - 1:
+                        raise
+                    time.sleep(min(RETRY_MAX_WAIT, 2 ** attempt) + random.uniform(0, 1))
+        return wrapper
+    return decorator
+
+
+@st.cache_resource
 def get_client():
     cfg = st.secrets.get("gsheets")
     if not cfg:
@@ -151,33 +183,139 @@ def get_client():
     return gc, sid, info
 
 
-def open_sheet(gc, ssid, tab):
-    sh = gc.open_by_key(ssid)
-    try:
-        ws = sh.worksheet(tab)
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title=tab, rows=1000, cols=20)
-        ws.append_row(TEMPLATE[tab])
-    return ws
-
-
-def ws_to_df(ws) -> pd.DataFrame:
-    values = ws.get_all_values()
+# Opened once per process: returns (sh, {title: ws}, {title: header row}).
+# Missing tabs / header rows are created here too, so that setup only costs
+# round trips on a cold start, and writers never need to re-read row 1.
+@st.cache_resource
+def get_spreadsheet():
+    gc, sid, _ = get_client()
+    sh = gc.open_by_key(sid)
+    worksheets = {ws.title: ws for ws in sh.worksheets()}
+    headers = {}
+    for tab, template in TEMPLATE.items():
+        ws = worksheets.get(tab)
+        if ws is None:
+            ws = worksheets[tab] = sh.add_worksheet(tab, TAB_ROWS[tab], 20)
+        headers[tab] = ws.row_values(1)
+        if not headers[tab]:
+            ws.append_row(template)
+            headers[tab] = list(template)
+    return sh, worksheets, headers
+
+
+def values_to_df(values: List[List[Any]]) -> pd.DataFrame:
     if not values:
         return pd.DataFrame(columns=[])
     headers = values[0]
-    rows = values[1:]
+    # The values API drops trailing empty cells, so pad/trim rows to the header width
+    width = len(headers)
+    rows = [(r + [""] * (width - len(r)))[:width] for r in values[1:]]
     df = pd.DataFrame(rows, columns=headers)
-    for col in ["id", "brand_id", "percentage", "ingredient_id", "formulation_id"]:
+    for col in ["id", "brand_id", "ingredient_id", "formulation_id"]:
+        if col in df.columns:
+            # nullable ints: blank ids stay <NA> and filters compare natively;
+            # non-integral cells (e.g. 2.5) are treated as blank rather than failing the load
+            ids = pd.to_numeric(df[col], errors='coerce')
+            df[col] = ids.where(ids % 1 == 0).astype("Int64")
+    if "percentage" in df.columns:
+        df["percentage"] = pd.to_numeric(df["percentage"], errors='coerce')
+    for col in ["category", "product_type", "function", "phase"]:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+            # few distinct values: filters/groupby work on integer codes
+            df[col] = df[col].astype("category")
     return df
 
 
-def df_append(ws, row: Dict[str, Any]):
-    headers = ws.row_values(1)
-    out = [str(row.get(h, "")) for h in headers]
-    ws.append_row(out)
+# ids are already Int64 from values_to_df, so no re-coercion here
+def next_id(df: pd.DataFrame) -> int:
+    ids = df["id"].dropna() if "id" in df.columns else []
+    return int(ids.max()) + 1 if len(ids) else 1
+
+
+# modifiedTime comes from the Drive API, which the Sheets-only setup may not have
+# enabled (403). If it fails, fall back to a key that changes every DATA_TTL
+# seconds: load_all and every revision-keyed cache_data helper then miss
+# together, so the derived lookups never lag behind the reloaded frames.
+DATA_TTL = 300  # seconds
+
+
+def revision_fallback() -> str:
+    return f"ttl-{int(time.time() // DATA_TTL)}"
+
+
+# Per-process memo of a Drive 403, so later reruns stop sending a request that
+# is known to fail (re-probed on restart)
+@st.cache_resource
+def drive_state() -> Dict[str, bool]:
+    return {"forbidden": False}
+
+
+@with_backoff()
+def _last_update_time(sh) -> str:
+    return sh.get_lastUpdateTime()
+
+
+def get_revision(sh) -> str:
+    state = drive_state()
+    if state["forbidden"]:
+        return revision_fallback()
+    try:
+        return _last_update_time(sh)
+    except gspread.exceptions.APIError as e:
+        if getattr(e.response, "status_code", None) == 403:
+            state["forbidden"] = True
+        return revision_fallback()
+
+
+# All four tabs in one values.batchGet. `revision` is only part of the cache
+# key: with Drive it is the modifiedTime, which any edit to the spreadsheet
+# changes; without it, the DATA_TTL bucket (see revision_fallback), so cached
+# frames are at most DATA_TTL seconds behind the sheet.
+# cache_resource hands every rerun the same frames without the pickle round
+# trip cache_data does, so they are READ-ONLY: rebind (filter/merge/concat/copy)
+# instead of assigning into them.
+@st.cache_resource(ttl=DATA_TTL, show_spinner=False)
+@with_backoff()
+def load_all(revision: str) -> Dict[str, pd.DataFrame]:
+    sh, _, _ = get_spreadsheet()
+    tabs = list(TEMPLATE)
+    resp = sh.values_batch_get([f"{tab}!A:Z" for tab in tabs])
+    return {tab: values_to_df(vr.get("values", [])) for tab, vr in zip(tabs, resp["valueRanges"])}
+
+
+# Drop the loaded frames and everything derived from them (cached per revision).
+# Used after our own writes, since Drive's modifiedTime can lag behind them.
+def clear_data_caches():
+    load_all.clear()
+    st.cache_data.clear()
+
+
+@with_backoff(WRITE_RETRY_STATUS)
+def df_append_many(ws, rows: List[Dict[str, Any]], headers: List[str]):
+    if not rows:
+        return
+    out = [[str(row.get(h, "")) for h in headers] for row in rows]
+    ws.append_rows(out, value_input_option="RAW")
+
+
+# Appends to several tabs in ONE spreadsheets.batchUpdate (appendCells per tab).
+# The API applies all subrequests or none, so a failed save never leaves
+# e.g. a formulation without its ingredient rows.
+@with_backoff(WRITE_RETRY_STATUS)
+def df_append_batch(sh, writes: List[Tuple[Any, List[Dict[str, Any]], List[str]]]):
+    requests = [
+        {"appendCells": {
+            "sheetId": ws.id,
+            "rows": [
+                {"values": [{"userEnteredValue": {"stringValue": str(row.get(h, ""))}} for h in headers]}
+                for row in rows
+            ],
+            "fields": "userEnteredValue",
+        }}
+        for ws, rows, headers in writes if rows
+    ]
+    if requests:
+        sh.batch_update({"requests": requests})
 
 # Template headers for auto-creation
 TEMPLATE = {
@@ -187,6 +325,17 @@ TEMPLATE = {
     "Formulation_Ingredients": ["id", "formulation_id", "ingredient_id", "percentage", "phase", "notes"],
 }
 
+# Initial grid size for auto-created tabs
+TAB_ROWS = {
+    "Brands": 1000,
+    "Formulations": 2000,
+    "Ingredients": 5000,
+    "Formulation_Ingredients": 10000,
+}
+
+# Separators accepted in the bulk INCI paste (commas and line breaks)
+_TOKEN_SPLIT = re.compile(r"[,\r\n]+")
+
 # ------------------------------
 # Diagnostics
 # ------------------------------
@@ -205,24 +354,22 @@ with st.expander("🧪 Run Google Sheets Diagnostics"):
 # ------------------------------
 # Load DataFrames
 # ------------------------------
+if st.button("🔄 Refresh data"):
+    clear_data_caches()
+
 try:
-    gc, SSID, sa_info = get_client()
-    sh = gc.open_by_key(SSID)
-    ws_brands = sh.worksheet("Brands") if "Brands" in [w.title for w in sh.worksheets()] else sh.add_worksheet("Brands", 1000, 20)
-    ws_forms = sh.worksheet("Formulations") if "Formulations" in [w.title for w in sh.worksheets()] else sh.add_worksheet("Formulations", 2000, 20)
-    ws_ings = sh.worksheet("Ingredients") if "Ingredients" in [w.title for w in sh.worksheets()] else sh.add_worksheet("Ingredients", 5000, 20)
-    ws_fi = sh.worksheet("Formulation_Ingredients") if "Formulation_Ingredients" in [w.title for w in sh.worksheets()] else sh.add_worksheet("Formulation_Ingredients", 10000, 20)
-
-    # Ensure headers exist
-    if not ws_brands.row_values(1): ws_brands.append_row(TEMPLATE["Brands"])
-    if not ws_forms.row_values(1): ws_forms.append_row(TEMPLATE["Formulations"])
-    if not ws_ings.row_values(1): ws_ings.append_row(TEMPLATE["Ingredients"])
-    if not ws_fi.row_values(1): ws_fi.append_row(TEMPLATE["Formulation_Ingredients"])
-
-    df_brands = ws_to_df(ws_brands)
-    df_forms = ws_to_df(ws_forms)
-    df_ings = ws_to_df(ws_ings)
-    df_fi = ws_to_df(ws_fi)
+    sh, worksheets, headers_by_tab = get_spreadsheet()
+    ws_brands = worksheets["Brands"]
+    ws_forms = worksheets["Formulations"]
+    ws_ings = worksheets["Ingredients"]
+    ws_fi = worksheets["Formulation_Ingredients"]
+
+    revision = get_revision(sh)
+    frames = load_all(revision)
+    df_brands = frames["Brands"]
+    df_forms = frames["Formulations"]
+    df_ings = frames["Ingredients"]
+    df_fi = frames["Formulation_Ingredients"]
 except Exception as e:
     st.error(f"❌ Google Sheets connection failed: {e}")
     st.stop()
@@ -230,20 +377,38 @@ except Exception as e:
 # ------------------------------
 # Sidebar Filters & Recommender switches
 # ------------------------------
+# Option lists only change with the data, so they are cached per revision
+@st.cache_data(max_entries=8, show_spinner=False)
+def sidebar_options(revision: str, _df_forms, _df_brands) -> Dict[str, Any]:
+    # category/product_type are categorical (values_to_df), so .cat.categories is already unique + sorted
+    categories = _df_forms.get("category", pd.Series(dtype="category"))
+    product_types = _df_forms.get("product_type", pd.Series(dtype="category"))
+    return {
+        "cats": [c for c in categories.cat.categories if c],
+        "ptypes": list(product_types.cat.categories),
+        "ptypes_by_cat": {
+            cat: list(pts.cat.remove_unused_categories().cat.categories)
+            for cat, pts in product_types.groupby(categories, observed=True)
+        },
+        "brands": sorted(_df_brands.get("name", pd.Series(dtype=str)).dropna().unique().tolist()),
+    }
+
+options = sidebar_options(revision, df_forms, df_brands)
+
 with st.sidebar:
     st.header("Filters")
-    cats = ["(All)"] + sorted([c for c in df_forms.get("category", pd.Series(dtype=str)).dropna().unique().tolist() if c])
+    cats = ["(All)"] + options["cats"]
     sel_cat = st.selectbox("Category", cats)
     sel_cat_q = None if sel_cat == "(All)" else sel_cat
 
     if sel_cat_q:
-        ptypes = ["(All)"] + sorted(df_forms[df_forms["category"]==sel_cat_q]["product_type"].dropna().unique().tolist())
+        ptypes = ["(All)"] + options["ptypes_by_cat"].get(sel_cat_q, [])
     else:
-        ptypes = ["(All)"] + sorted(df_forms.get("product_type", pd.Series(dtype=str)).dropna().unique().tolist())
+        ptypes = ["(All)"] + options["ptypes"]
     sel_ptype = st.selectbox("Product Type", ptypes)
     sel_ptype_q = None if sel_ptype == "(All)" else sel_ptype
 
-    brands = ["(All)"] + sorted(df_brands.get("name", pd.Series(dtype=str)).dropna().unique().tolist())
+    brands = ["(All)"] + options["brands"]
     sel_brand = st.selectbox("Brand", brands)
     sel_brand_q = None if sel_brand == "(All)" else sel_brand
 
@@ -257,55 +422,89 @@ with st.sidebar:
 # ------------------------------
 # Browse Formulations
 # ------------------------------
-_dfv = df_forms.copy()
-if sel_cat_q: _dfv = _dfv[_dfv["category"] == sel_cat_q]
-if sel_ptype_q: _dfv = _dfv[_dfv["product_type"] == sel_ptype_q]
+# brand name ↔ id lookups, rebuilt only when the data revision changes
+@st.cache_data(max_entries=8, show_spinner=False)
+def brand_maps(revision: str, _df_brands) -> Tuple[Dict[str, int], Dict[int, str]]:
+    brands = _df_brands.reindex(columns=["id", "name"]).dropna()
+    ids = brands["id"].astype(int)
+    return dict(zip(brands["name"], ids)), dict(zip(ids, brands["name"]))
+
+name_to_id, id_to_name = brand_maps(revision, df_brands)
+
+# One combined mask, then a single column-subset selection (no full-frame copy)
+mask = pd.Series(True, index=df_forms.index)
+if sel_cat_q: mask &= df_forms["category"].eq(sel_cat_q)
+if sel_ptype_q: mask &= df_forms["product_type"].eq(sel_ptype_q)
 if sel_brand_q:
     # map brand name → id
-    name_to_id = {r["name"]: int(r["id"]) for _, r in df_brands.iterrows() if pd.notna(r.get("id")) and pd.notna(r.get("name"))}
     bid = name_to_id.get(sel_brand_q)
     if bid is not None:
-        _dfv = _dfv[_dfv["brand_id"].astype(float) == float(bid)]
+        mask &= df_forms["brand_id"].eq(bid).fillna(False)
 
-id_to_name = {int(r["id"]): r["name"] for _, r in df_brands.iterrows() if pd.notna(r.get("id")) and pd.notna(r.get("name"))}
-_dfv["brand"] = _dfv.get("brand_id", pd.Series(dtype=float)).map(lambda v: id_to_name.get(int(v), "") if pd.notna(v) else "")
+_dfv = df_forms.loc[mask, ["id","name","brand_id","category","product_type","notes"]]
+_dfv = _dfv.assign(brand=_dfv["brand_id"].map(id_to_name).fillna(""))
 
 st.subheader("Formulations")
 st.dataframe(_dfv[["id","name","brand","category","product_type","notes"]].reset_index(drop=True), use_container_width=True, hide_index=True)
 
 sel_ids = st.multiselect("Select formulation IDs to view details", _dfv.get("id", pd.Series(dtype=float)).dropna().astype(int).tolist())
 if sel_ids:
+    # One filter + merge for all selected ids, then split per formulation
+    merged = df_fi[df_fi["formulation_id"].isin(sel_ids)].merge(df_ings, left_on="ingredient_id", right_on="id", how="left", suffixes=("","_ing"))
+    show = merged[["inci_name","common_name","function","percentage","phase","notes"]]
+    show.columns = ["INCI","Common","Function","Percent","Phase","Notes"]
+    by_fid = dict(tuple(show.groupby(merged["formulation_id"], sort=False)))
     for fid in sel_ids:
         st.markdown(f"**Ingredients — Formulation ID {int(fid)}**")
-        df_one = df_fi[df_fi["formulation_id"].astype(float) == float(fid)]
-        merged = df_one.merge(df_ings, left_on="ingredient_id", right_on="id", how="left", suffixes=("","_ing"))
-        show = merged[["inci_name","common_name","function","percentage","phase","notes"]].copy()
-        show.columns = ["INCI","Common","Function","Percent","Phase","Notes"]
-        st.dataframe(show.reset_index(drop=True), use_container_width=True, hide_index=True)
+        st.dataframe(by_fid.get(fid, show.iloc[0:0]).reset_index(drop=True), use_container_width=True, hide_index=True)
 
 # ------------------------------
 # Ingredient Frequency
 # ------------------------------
 st.markdown("---")
 st.subheader("Ingredient Frequency (within current filters)")
-fi = df_fi.merge(df_forms, left_on="formulation_id", right_on="id", how="left", suffixes=("","_form"))
-if sel_cat_q: fi = fi[fi["category"] == sel_cat_q]
-if sel_ptype_q: fi = fi[fi["product_type"] == sel_ptype_q]
 
-freq = fi.groupby("ingredient_id").agg(Count=("formulation_id","nunique")).reset_index()
-freq = freq.merge(df_ings, left_on="ingredient_id", right_on="id", how="left")
-freq = freq[["inci_name","common_name","function","Count"]].sort_values(["Count","inci_name"], ascending=[False, True])
-st.dataframe(freq.reset_index(drop=True), use_container_width=True, hide_index=True)
+# Underscored frames are not hashed by Streamlit; `revision` stands in for them.
+@st.cache_data(max_entries=64, show_spinner=False)
+def compute_freq(revision: str, cat, ptype, _df_fi, _df_forms, _df_ings) -> pd.DataFrame:
+    # Filter formulations first, then semi-join FI on their ids: no wide merge
+    fi = _df_fi
+    if cat or ptype:
+        forms = _df_forms
+        if cat: forms = forms[forms["category"] == cat]
+        if ptype: forms = forms[forms["product_type"] == ptype]
+        fi = fi[fi["formulation_id"].isin(forms["id"].dropna())]
+
+    freq = fi.groupby("ingredient_id")["formulation_id"].nunique().rename("Count").reset_index()
+    freq = freq.merge(_df_ings, left_on="ingredient_id", right_on="id", how="left")
+    freq = freq[["inci_name","common_name","function","Count"]].sort_values(["Count","inci_name"], ascending=[False, True])
+    return freq.reset_index(drop=True)
+
+freq = compute_freq(revision, sel_cat_q, sel_ptype_q, df_fi, df_forms, df_ings)
+st.dataframe(freq, use_container_width=True, hide_index=True)
 
 # ------------------------------
 # Typical Ingredient List / Structure
 # ------------------------------
 st.markdown("---")
 st.subheader("Typical Ingredient List / Structure")
+
+# The rule tables are constants, so their DataFrames are built once per process
+# (cache_resource: shared and READ-ONLY) instead of on every rerun
+@st.cache_resource(show_spinner=False)
+def rule_frames() -> Tuple[Dict[Tuple[str, str], pd.DataFrame], Dict[str, pd.DataFrame]]:
+    base_by_key = {
+        key: pd.DataFrame(rules["base_structure"], columns=["Component", "Function", "Typical Range"])
+        for key, rules in RULES_BY_PRODUCT.items()
+    }
+    combo_by_name = {sys["name"]: pd.DataFrame(sys["combo"]) for sys in BODY_WASH_RULES["surfactant_systems"]}
+    return base_by_key, combo_by_name
+
+base_by_key, combo_by_name = rule_frames()
+
 rule_key = (sel_cat_q or "Bodycare", sel_ptype_q or "Body Wash")
-rules = RULES_BY_PRODUCT.get(rule_key)
-if rules:
-    base = pd.DataFrame(rules["base_structure"], columns=["Component", "Function", "Typical Range"])
+base = base_by_key.get(rule_key)
+if base is not None:
     st.write("**Base Structure (guideline)**")
     st.dataframe(base, use_container_width=True, hide_index=True)
 else:
@@ -316,20 +515,26 @@ else:
 # ------------------------------
 st.markdown("---")
 st.subheader("Recommended Surfactant Systems")
-if rec_target == "Body Wash":
-    candidates = BODY_WASH_RULES["surfactant_systems"]
+
+# Only 8 possible inputs, so the ranking is memoized. st.cache_data rather than
+# functools.lru_cache: Streamlit re-executes this script on every rerun, which
+# would start a fresh lru_cache each time.
+@st.cache_data(show_spinner=False)
+def rank_surfactants(sulfate_free: bool, mild: bool, high_foam: bool) -> List[Dict[str, Any]]:
     def score_system(sys):
         score = 0
         t = sys["tags"]
-        if want_sulfate_free and "sulfate‑free" in t: score += 2
-        if want_mild and "mild" in t: score += 2
-        if want_high_foam and "high foam" in t: score += 1
-        if not want_mild and "cost" in t: score += 1
+        if sulfate_free and "sulfate‑free" in t: score += 2
+        if mild and "mild" in t: score += 2
+        if high_foam and "high foam" in t: score += 1
+        if not mild and "cost" in t: score += 1
         return score
-    ranked = sorted(candidates, key=score_system, reverse=True)
-    for sys in ranked:
+    return sorted(BODY_WASH_RULES["surfactant_systems"], key=score_system, reverse=True)
+
+if rec_target == "Body Wash":
+    for sys in rank_surfactants(want_sulfate_free, want_mild, want_high_foam):
         with st.expander(f"{sys['name']}  —  tags: {', '.join(sys['tags'])}"):
-            st.write(pd.DataFrame(sys["combo"]))
+            st.write(combo_by_name[sys["name"]])
 else:
     st.info("Surfactant recommender currently optimized for Body Wash.")
 
@@ -345,7 +550,7 @@ with st.form("add_formulation"):
         f_category = st.selectbox("Category", ["Skincare","Bodycare","Haircare","Decorative","Fragrance","Other"], index=1)
         f_ptype = st.text_input("Product Type", value="Body Wash")
     with colB:
-        all_brands = ["(new)"] + sorted(df_brands.get("name", pd.Series(dtype=str)).dropna().unique().tolist())
+        all_brands = ["(new)"] + options["brands"]
         sel_brand = st.selectbox("Brand", all_brands)
         new_brand_name = st.text_input("If new brand, type name here")
         f_notes = st.text_area("Notes", height=80)
@@ -364,6 +569,9 @@ with st.form("add_formulation"):
 
     if submitted:
         try:
+            # Rows are collected per tab and written in one batchUpdate at the end
+            new_brand_rows, new_form_rows = [], []
+
             # Ensure brand id
             if sel_brand != "(new)":
                 bid = int(df_brands.loc[df_brands["name"]==sel_brand, "id"].iloc[0]) if not df_brands.empty else 1
@@ -371,13 +579,12 @@ with st.form("add_formulation"):
                 if not new_brand_name.strip():
                     st.error("Please enter a new brand name.")
                     st.stop()
-                next_bid = 1 if df_brands.empty else int(pd.to_numeric(df_brands["id"], errors='coerce').max()) + 1
-                df_append(ws_brands, {"id": next_bid, "name": new_brand_name.strip()})
-                df_brands.loc[len(df_brands)] = {"id": next_bid, "name": new_brand_name.strip()}
+                next_bid = next_id(df_brands)
+                new_brand_rows.append({"id": next_bid, "name": new_brand_name.strip()})
                 bid = next_bid
 
-            next_fid = 1 if df_forms.empty else int(pd.to_numeric(df_forms["id"], errors='coerce').max()) + 1
-            df_append(ws_forms, {
+            next_fid = next_id(df_forms)
+            new_form_rows.append({
                 "id": next_fid,
                 "name": f_name.strip(),
                 "brand_id": bid,
@@ -386,68 +593,56 @@ with st.form("add_formulation"):
                 "notes": f_notes.strip()
             })
 
-            next_ing_id_start = 1 if df_ings.empty else int(pd.to_numeric(df_ings["id"], errors='coerce').max()) + 1
-            next_fi_id = 1 if df_fi.empty else int(pd.to_numeric(df_fi["id"], errors='coerce').max()) + 1
-            ing_lines = [ln.strip() for ln in ing_text.splitlines() if ln.strip()]
-
-            for ln in ing_lines:
-                parts = [p.strip() for p in ln.split("|")]
-                if len(parts) < 4:
-                    continue
-                inci, common, func, pct = parts[0], parts[1], parts[2], parts[3]
-                phase = parts[4] if len(parts) > 4 else ""
-                notes = parts[5] if len(parts) > 5 else ""
-
-                exists = df_ings[df_ings.get("inci_name", pd.Series(dtype=str)).str.lower()==inci.lower()] if not df_ings.empty else pd.DataFrame()
-                if exists.empty:
-                    ing_id = next_ing_id_start
-                    next_ing_id_start += 1
-                    df_append(ws_ings, {
-                        "id": ing_id,
-                        "inci_name": inci,
-                        "common_name": common,
-                        "function": func,
-                        "cas": ""
-                    })
-                    df_ings.loc[len(df_ings)] = {"id": ing_id, "inci_name": inci, "common_name": common, "function": func, "cas": ""}
-                else:
-                    ing_id = int(pd.to_numeric(exists.iloc[0]["id"]).item()) if pd.notna(exists.iloc[0]["id"]) else int(pd.to_numeric(df_ings["id"], errors='coerce').max())
-
-                df_append(ws_fi, {
-                    "id": next_fi_id,
-                    "formulation_id": next_fid,
-                    "ingredient_id": ing_id,
-                    "percentage": pct,
-                    "phase": phase,
-                    "notes": notes
-                })
-                next_fi_id += 1
-
-            st.success(f"Saved formulation '{f_name}' and ingredients to Google Sheets.")
-            st.info("Click Rerun to refresh tables above.")
+            next_ing_id_start = next_id(df_ings)
+            next_fi_id = next_id(df_fi)
+            ing_lines = pd.Series([ln.strip() for ln in ing_text.splitlines() if ln.strip()], dtype=object)
+            # One vectorized split: columns 0-5 = INCI | Common | Function | % | Phase | Notes;
+            # lines with fewer than 4 fields are skipped, extra fields ignored
+            parts = ing_lines.str.split("|", expand=True).reindex(columns=range(6))
+            parts = parts[parts[3].notna()].fillna("").astype(str).apply(lambda col: col.str.strip())
+            keys = parts[0].str.lower()
+
+            # lowercased INCI → id (first row wins); rows without an id can't be referenced
+            _ings = df_ings.reindex(columns=["inci_name", "id"]).dropna()
+            inci_to_id = dict(zip(_ings["inci_name"].str.lower()[::-1], _ings["id"].astype(int)[::-1]))
+
+            # Unknown INCIs get new ids in order of first appearance
+            new_ings = parts[~keys.isin(inci_to_id.keys()) & ~keys.duplicated()]
+            new_ing_ids = range(next_ing_id_start, next_ing_id_start + len(new_ings))
+            inci_to_id.update(zip(keys[new_ings.index], new_ing_ids))
+            new_ing_rows = pd.DataFrame({
+                "id": new_ing_ids,
+                "inci_name": new_ings[0].values,
+                "common_name": new_ings[1].values,
+                "function": new_ings[2].values,
+                "cas": ""
+            }).to_dict("records")
+
+            ing_ids = keys.map(inci_to_id)
+            new_fi_rows = pd.DataFrame({
+                "id": range(next_fi_id, next_fi_id + len(parts)),
+                "formulation_id": next_fid,
+                "ingredient_id": ing_ids.astype("int64").values,
+                "percentage": parts[3].values,
+                "phase": parts[4].values,
+                "notes": parts[5].values
+            }).to_dict("records")
+
+            df_append_batch(sh, [
+                (ws_brands, new_brand_rows, headers_by_tab["Brands"]),
+                (ws_forms, new_form_rows, headers_by_tab["Formulations"]),
+                (ws_ings, new_ing_rows, headers_by_tab["Ingredients"]),
+                (ws_fi, new_fi_rows, headers_by_tab["Formulation_Ingredients"]),
+            ])
+
+            # reload so the tables above include the new rows
+            clear_data_caches()
+            st.session_state["saved_formulation"] = f"Saved formulation '{f_name}' and ingredients to Google Sheets."
+            st.rerun()
         except Exception as e:
             st.error(f"Failed to save: {e}")
-
-# ------------------------------
-# Bulk Add Ingredients from INCI list
-# ------------------------------
-st.markdown("---")
-st.header("Bulk Add Ingredients — INCI List → Google Sheets")
-st.caption(
-    "Paste a comma-separated or newline-separated list of INCI names. "
-    "We'll add them to the Ingredients tab with auto IDs. "
-    "Other columns (common_name, function, cas) can be filled later."
-)
-with st.form("bulk_ing_add"):
-    inci_raw = st.text_area(
-        "INCI list (comma or newline separated)",
-        height=140,
-        placeholder="Aqua, Dimethicone, Cyclopentasiloxane, Titanium Dioxide, Glycerin"
-    )
-    dedup = st.checkbox("De-duplicate before adding", value=True)
-    default_function = st.text_input("Default Function (optional)", value="")
-    default_common = st.text_input("Default Common Name (optional)", value="")
-    submitted_bulk = st.form_submit_button("➕ Add to Ingredients")
+    elif "saved_formulation" in st.session_state:
+        st.success(st.session_state.pop("saved_formulation"))
 
 # ------------------------------
 # Bulk Add Ingredients from INCI list
@@ -473,54 +668,43 @@ with st.form("bulk_ing_add"):
 
 if submitted_bulk:
     try:
-        tokens = []
-        for line in inci_raw.replace("\r", "\n").split("\n"):
-            for part in line.split(","):
-                name = part.strip()
-                if name:
-                    tokens.append(name)
+        tokens = [t.strip() for t in _TOKEN_SPLIT.split(inci_raw) if t.strip()]
 
         if not tokens:
             st.warning("No INCI names detected.")
         else:
+            tokens = pd.Series(tokens, dtype=object)
             if dedup:
-                tokens = list(dict.fromkeys(tokens))  # remove duplicates but keep order
-
-            # Check existing ingredients
-            existing = set()
-            if not df_ings.empty and "inci_name" in df_ings.columns:
-                existing = set(df_ings["inci_name"].dropna().str.lower().tolist())
-
-            next_ing_id = 1 if df_ings.empty else int(pd.to_numeric(df_ings["id"], errors='coerce').max()) + 1
-            added = 0
-
-            for inci in tokens:
-                if inci.lower() in existing:
-                    continue  # skip duplicates
-                df_append(ws_ings, {
-                    "id": next_ing_id,
-                    "inci_name": inci,
-                    "common_name": default_common,
-                    "function": default_function,
-                    "cas": ""
-                })
-                # update local dataframe
-                df_ings.loc[len(df_ings)] = {
-                    "id": next_ing_id,
-                    "inci_name": inci,
-                    "common_name": default_common,
-                    "function": default_function,
-                    "cas": ""
-                }
-                existing.add(inci.lower())
-                next_ing_id += 1
-                added += 1
-
-            st.success(f"Added {added} ingredient(s) to Google Sheets.")
+                tokens = tokens.drop_duplicates()  # remove duplicates but keep order
+
+            # Skip INCIs that already exist or repeat earlier in the paste (case-insensitive)
+            existing = df_ings.get("inci_name", pd.Series(dtype=str)).dropna().str.lower()
+            keys = tokens.str.lower()
+            new_tokens = tokens[~keys.isin(existing) & ~keys.duplicated()]
+
+            next_ing_id = next_id(df_ings)
+            new_rows = pd.DataFrame({
+                "id": range(next_ing_id, next_ing_id + len(new_tokens)),
+                "inci_name": new_tokens.values,
+                "common_name": default_common,
+                "function": default_function,
+                "cas": ""
+            }).to_dict("records")
+
+            df_append_many(ws_ings, new_rows, headers_by_tab["Ingredients"])
+            added = len(new_rows)
+
             if added == 0:
+                st.success(f"Added {added} ingredient(s) to Google Sheets.")
                 st.info("Nothing new to add — everything already existed or input was empty.")
+            else:
+                clear_data_caches()
+                st.session_state["bulk_added"] = f"Added {added} ingredient(s) to Google Sheets."
+                st.rerun()
     except Exception as e:
         st.error(f"Failed to add ingredients: {e}")
+elif "bulk_added" in st.session_state:
+    st.success(st.session_state.pop("bulk_added"))
 
 
 # ------------------------------